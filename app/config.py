@@ -14,12 +14,37 @@ class Settings:
     # OpenAI API
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o")
+    OPENAI_TIMEOUT: float = float(os.getenv("OPENAI_TIMEOUT", "20"))  # Seconds per request
+    OPENAI_CONNECT_TIMEOUT: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", "5"))  # Retries on 429/5xx/timeouts
+    OPENAI_MAX_TOKENS: int = int(os.getenv("OPENAI_MAX_TOKENS", "500"))
+    
+    # LLM throughput
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))  # Max in-flight requests
+    LLM_BATCH_SIZE: int = int(os.getenv("LLM_BATCH_SIZE", "15"))  # Changes per request
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "30000"))
+    LLM_CACHE_SIZE: int = int(os.getenv("LLM_CACHE_SIZE", "4096"))  # Cached classifications
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "")  # SQLite file; empty = memory only
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", str(30 * 86400)))  # Seconds
     
     # App settings
     APP_NAME: str = "Document Change Tracker"
     APP_VERSION: str = "1.0.0"
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     
+    # Use rapidfuzz's C++ alignment for block/word diffs when installed
+    USE_RAPIDFUZZ: bool = os.getenv("USE_RAPIDFUZZ", "false").lower() == "true"
+    
+    # Worker pool for CPU-bound parsing, diffing and annotation
+    WORKER_THREADS: int = int(os.getenv("WORKER_THREADS", str(min(os.cpu_count() or 1, 4))))
+    
+    # Annotated document storage (empty = keep in memory)
+    STORAGE_DIR: str = os.getenv("STORAGE_DIR", "")
+    STORAGE_MAX_DOCS: int = int(os.getenv("STORAGE_MAX_DOCS", "256"))  # Oldest-used evicted beyond this
+    STORAGE_TTL: int = int(os.getenv("STORAGE_TTL", "3600"))  # Seconds before a document expires
+    STORAGE_CLEANUP_INTERVAL: int = int(os.getenv("STORAGE_CLEANUP_INTERVAL", "300"))  # Sweep period, seconds
+    
     # CORS
     CORS_ORIGINS: list = ["*"]  # Restrict in production
 
@@ -4,12 +4,17 @@ FastAPI application entry point.
 """
 
 import time
-import hashlib
+import asyncio
+import logging
+import secrets
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from urllib.parse import quote
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import StreamingResponse
 
 from app.config import settings
 from app.models import (
@@ -25,12 +30,40 @@ from app.services import (
     classify_changes,
     create_annotated_document,
 )
-from app.utils import document_storage
+from app.utils import document_storage, llm_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+async def _sweep_storage(executor: ThreadPoolExecutor):
+    """Periodically drop expired annotated documents, off the request path."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(settings.STORAGE_CLEANUP_INTERVAL)
+        try:
+            removed = await loop.run_in_executor(executor, document_storage.cleanup)
+            if removed:
+                logger.debug("Removed %d expired documents", removed)
+        except Exception as e:
+            logger.warning("Storage cleanup failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Own the worker pool that keeps CPU-bound document work off the event loop."""
+    app.state.executor = ThreadPoolExecutor(max_workers=settings.WORKER_THREADS)
+    sweeper = asyncio.create_task(_sweep_storage(app.state.executor))
+    yield
+    sweeper.cancel()
+    app.state.executor.shutdown(wait=False)
+
 
 app = FastAPI(
     title=settings.APP_NAME,
     description="Compare two Word documents and classify change impacts for banking compliance",
     version=settings.APP_VERSION,
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -49,6 +82,7 @@ async def root():
         "status": "healthy",
         "service": settings.APP_NAME,
         "version": settings.APP_VERSION,
+        "llm_cache": llm_cache.stats,
     }
 
 
@@ -66,6 +100,10 @@ async def compare_documents(
         default="general",
         description="Document type: general, contract, policy, report"
     ),
+    annotate: bool = Form(
+        default=True,
+        description="Generate the annotated document (skipped when all changes are low impact)"
+    ),
 ):
     """
     Compare two Word documents and classify the impact of changes.
@@ -84,25 +122,35 @@ async def compare_documents(
     if not file_v2.filename.endswith('.docx'):
         raise HTTPException(400, f"File 2 must be .docx, got: {file_v2.filename}")
     
+    loop = asyncio.get_running_loop()
+    executor = app.state.executor
+    
     try:
-        # Read file contents
-        bytes_v1 = await file_v1.read()
-        bytes_v2 = await file_v2.read()
+        # Uploads are already spooled to temp files (memory, then disk);
+        # parse them in place instead of copying both into RAM
+        source_v1 = file_v1.file
+        source_v2 = file_v2.file
         
-        # Step 1: Parse documents
+        # Step 1: Parse documents (concurrently, off the event loop)
         parse_start = time.time()
-        blocks_v1 = parse_document(bytes_v1)
-        blocks_v2 = parse_document(bytes_v2)
+        blocks_v1, blocks_v2 = await asyncio.gather(
+            loop.run_in_executor(executor, parse_document, source_v1),
+            loop.run_in_executor(executor, parse_document, source_v2),
+        )
         parsing_ms = int((time.time() - parse_start) * 1000)
         
+        # v1 is not needed after parsing; release its spooled buffer now
+        # instead of holding it through the LLM wait and annotation
+        await file_v1.close()
+        
         # Step 2: Detect changes
         diff_start = time.time()
-        changes = diff_documents(blocks_v1, blocks_v2)
+        changes = await loop.run_in_executor(executor, diff_documents, blocks_v1, blocks_v2)
         diffing_ms = int((time.time() - diff_start) * 1000)
         
         # Step 3: Classify changes (hybrid approach)
         classify_start = time.time()
-        classification_result = classify_changes(
+        classification_result = await classify_changes(
             changes,
             document_type=document_type,
             api_key=settings.OPENAI_API_KEY
@@ -111,29 +159,43 @@ async def compare_documents(
         llm_ms = classification_result.llm_time_ms
         classification_ms = int((time.time() - classify_start) * 1000)
         
-        # Step 4: Generate annotated document
+        # Step 4: Generate annotated document (only worth it if something
+        # above LOW impact changed)
         annotate_start = time.time()
         annotated_doc_id = None
-        if classified:
+        annotation_skipped = None
+        if not annotate:
+            annotation_skipped = "disabled"
+        elif not classified:
+            annotation_skipped = "no_changes"
+        elif all(c.impact == ImpactLevel.LOW for c in classified):
+            annotation_skipped = "low_impact_only"
+        else:
             try:
-                annotated_bytes = create_annotated_document(bytes_v2, classified)
-                doc_id = hashlib.md5(
-                    f"{file_v1.filename}{file_v2.filename}{time.time()}".encode()
-                ).hexdigest()[:12]
-                document_storage.store(
-                    doc_id=doc_id,
-                    doc_bytes=annotated_bytes,
-                    filename=f"annotated_{file_v2.filename}"
+                source_v2.seek(0)
+                annotated_bytes = await loop.run_in_executor(
+                    executor, create_annotated_document, source_v2, classified
+                )
+                doc_id = secrets.token_hex(6)
+                # Disk-backed storage writes the file and unlinks evictions
+                await loop.run_in_executor(
+                    executor,
+                    document_storage.store,
+                    doc_id,
+                    annotated_bytes,
+                    f"annotated_{file_v2.filename}"
                 )
                 annotated_doc_id = doc_id
             except Exception as e:
-                print(f"Warning: Could not create annotated document: {e}")
+                logger.warning("Could not create annotated document: %s", e)
+        await file_v2.close()
         annotation_ms = int((time.time() - annotate_start) * 1000)
         
         # Build response
         total_time_ms = int((time.time() - start_time) * 1000)
         
-        timing = TimingBreakdown(
+        # Inputs are our own typed values, so skip per-object validation
+        timing = TimingBreakdown.model_construct(
             total_ms=total_time_ms,
             parsing_ms=parsing_ms,
             diffing_ms=diffing_ms,
@@ -142,15 +204,16 @@ async def compare_documents(
             annotation_ms=annotation_ms
         )
         
-        summary = ChangeSummary(
+        impact_counts = Counter(c.impact for c in classified)
+        summary = ChangeSummary.model_construct(
             total=len(classified),
-            critical=sum(1 for c in classified if c.impact == ImpactLevel.CRITICAL),
-            medium=sum(1 for c in classified if c.impact == ImpactLevel.MEDIUM),
-            low=sum(1 for c in classified if c.impact == ImpactLevel.LOW),
+            critical=impact_counts[ImpactLevel.CRITICAL],
+            medium=impact_counts[ImpactLevel.MEDIUM],
+            low=impact_counts[ImpactLevel.LOW],
         )
         
         change_details = [
-            ChangeDetail(
+            ChangeDetail.model_construct(
                 change_id=c.change_id,
                 change_type=c.change_type.value,
                 block_type=c.block_type,
@@ -166,7 +229,7 @@ async def compare_documents(
             for c in classified
         ]
         
-        return CompareResponse(
+        return CompareResponse.model_construct(
             success=True,
             summary=summary,
             changes=change_details,
@@ -180,6 +243,7 @@ async def compare_documents(
                 "document_type": document_type,
                 "llm_available": bool(settings.OPENAI_API_KEY),
                 "llm_calls": classification_result.llm_calls,
+                "annotation_skipped": annotation_skipped,
             },
             annotated_doc_id=annotated_doc_id
         )
@@ -191,20 +255,23 @@ async def compare_documents(
 @app.get("/api/download/{doc_id}")
 async def download_annotated_document(doc_id: str):
     """Download the annotated document with highlights and comments."""
-    doc_info = document_storage.get(doc_id)
+    opened = document_storage.open_document(doc_id)
     
-    if not doc_info:
+    if not opened:
         raise HTTPException(404, "Document not found. It may have expired.")
+    doc_info, source = opened
     
     # URL-encode filename for non-ASCII characters (Vietnamese, etc.)
     filename = doc_info['filename']
     encoded_filename = quote(filename)
     
-    return Response(
-        content=doc_info['bytes'],
+    # Stream in chunks rather than copying the whole document into the response
+    return StreamingResponse(
+        document_storage.iter_chunks(source),
         media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         headers={
-            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
+            "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
+            "Content-Length": str(doc_info['size'])
         }
     )
     
@@ -2,21 +2,26 @@
 Data models and schemas for document change tracking.
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from typing import List
 from pydantic import BaseModel
 
 from app.models.enums import ChangeType, ImpactLevel
 
-@dataclass
+@dataclass(slots=True)
 class ContentBlock:
     """A single unit of document content."""
     index: int          # Position in document
     block_type: str     # "paragraph" or "table"
     content: str        # The actual text
+    words: List[str] = field(init=False, repr=False, compare=False)  # content.split(), done once
+    
+    def __post_init__(self):
+        # slots=True rules out functools.cached_property, so split eagerly
+        self.words = self.content.split()
 
 
-@dataclass
+@dataclass(slots=True)
 class WordChange:
     """A single word-level change within a block."""
     change_type: str    # "added", "deleted", "replaced"
@@ -25,7 +30,7 @@ class WordChange:
     context: str        # Surrounding words for context
 
 
-@dataclass
+@dataclass(slots=True)
 class Change:
     """A detected change between two documents."""
     change_id: int
@@ -39,24 +44,34 @@ class Change:
     word_changes: List[WordChange] | None
 
 
-@dataclass
-class ClassifiedChange:
+@dataclass(slots=True)
+class ClassifiedChange(Change):
     """A change with impact classification."""
-    # Original Change fields
-    change_id: int
-    change_type: ChangeType
-    block_type: str
-    location: str
-    original: str | None
-    modified: str | None
-    similarity: float | None
-    diff_text: str | None
-    word_changes: List[WordChange] | None
-    # Classification fields
     impact: ImpactLevel
     reasoning: str
     risk_analysis: str
     classification_source: str  # "rule-based" or "llm"
+    
+    @classmethod
+    def from_change(
+        cls,
+        change: Change,
+        impact: ImpactLevel,
+        reasoning: str,
+        risk_analysis: str,
+        classification_source: str
+    ) -> "ClassifiedChange":
+        """Attach a classification to a change, sharing its field values."""
+        return cls(
+            **{name: getattr(change, name) for name in _CHANGE_FIELDS},
+            impact=impact,
+            reasoning=reasoning,
+            risk_analysis=risk_analysis,
+            classification_source=classification_source
+        )
+
+
+_CHANGE_FIELDS = tuple(f.name for f in fields(Change))
 
 
 class ChangeSummary(BaseModel):
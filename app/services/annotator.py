@@ -4,15 +4,32 @@ Creates Word documents with highlighted changes and comments.
 """
 
 import io
-from typing import List
+import re
+from typing import List, BinaryIO
 
 from docx import Document
 from docx.shared import RGBColor, Pt
 from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
+from lxml import etree
 
 from app.models import ClassifiedChange, ImpactLevel
 
+try:
+    import ahocorasick
+except ImportError:  # Optional accelerator; falls back to substring checks
+    ahocorasick = None
+
+
+_BLOCK_INDEX_RE = re.compile(r'Block (\d+)')
+
+# Pre-resolved OOXML names for direct lxml edits
+_W_RPR = qn('w:rPr')
+_W_TCPR = qn('w:tcPr')
+_W_SHD = qn('w:shd')
+_W_VAL = qn('w:val')
+_W_COLOR = qn('w:color')
+_W_FILL = qn('w:fill')
+_RUN_HIGHLIGHT_PATH = f"{qn('w:r')}/{_W_RPR}/{qn('w:highlight')}"
 
 # Impact level to highlight color mapping
 IMPACT_COLORS = {
@@ -20,10 +37,18 @@ IMPACT_COLORS = {
     ImpactLevel.MEDIUM: RGBColor(255, 255, 102),     # Yellow
     ImpactLevel.LOW: RGBColor(200, 200, 200),        # Gray
 }
+DEFAULT_COLOR = RGBColor(255, 255, 0)                # Yellow
+
+# Hex fill strings, formatted once instead of per run/cell
+IMPACT_HEX = {
+    level: f'{color[0]:02x}{color[1]:02x}{color[2]:02x}'
+    for level, color in IMPACT_COLORS.items()
+}
+DEFAULT_HEX = f'{DEFAULT_COLOR[0]:02x}{DEFAULT_COLOR[1]:02x}{DEFAULT_COLOR[2]:02x}'
 
 
 def create_annotated_document(
-    modified_bytes: bytes,
+    modified_source: bytes | BinaryIO,
     classified_changes: List[ClassifiedChange]
 ) -> bytes:
     """
@@ -32,13 +57,15 @@ def create_annotated_document(
     2. Comments explaining each change
     
     Args:
-        modified_bytes: Raw bytes of the modified .docx file
+        modified_source: Raw bytes of the modified .docx file, or a seekable file object
         classified_changes: List of classified changes to annotate
         
     Returns:
         Bytes of the annotated .docx file
     """
-    doc = Document(io.BytesIO(modified_bytes))
+    if isinstance(modified_source, bytes):
+        modified_source = io.BytesIO(modified_source)
+    doc = Document(modified_source)
     block_map = _build_block_map(doc)
     
     for change in classified_changes:
@@ -66,38 +93,44 @@ def _build_block_map(doc: Document) -> dict:
     block_map = {}
     index = 0
     
+    # Index wrappers by their XML element once, so the body walk is linear
+    para_by_element = {para._element: para for para in doc.paragraphs}
+    table_by_element = {table._element: table for table in doc.tables}
+    
     for element in doc.element.body:
         tag = element.tag.split('}')[-1]
         
         if tag == 'p':
-            for para in doc.paragraphs:
-                if para._element is element:
-                    text = para.text.strip()
-                    if text:
-                        block_map[index] = {
-                            'type': 'paragraph',
-                            'element': para
-                        }
-                        index += 1
-                    break
+            para = para_by_element.get(element)
+            if para is not None and para.text.strip():
+                block_map[index] = {
+                    'type': 'paragraph',
+                    'element': para
+                }
+                index += 1
                     
         elif tag == 'tbl':
-            for table in doc.tables:
-                if table._element is element:
-                    block_map[index] = {
-                        'type': 'table',
-                        'element': table
-                    }
-                    index += 1
-                    break
+            table = table_by_element.get(element)
+            if table is not None:
+                block_map[index] = {
+                    'type': 'table',
+                    'element': table
+                }
+                index += 1
     
     return block_map
 
 
 def _extract_block_index(location: str) -> int | None:
     """Extract block index from location string like 'Block 16'."""
-    import re
-    match = re.search(r'Block (\d+)', location)
+    # Fast path for the differ's own "Block N" format
+    if location.startswith("Block "):
+        try:
+            return int(location[6:].split()[0]) - 1
+        except (ValueError, IndexError):
+            pass
+    
+    match = _BLOCK_INDEX_RE.search(location)
     if match:
         return int(match.group(1)) - 1
     return None
@@ -105,11 +138,14 @@ def _extract_block_index(location: str) -> int | None:
 
 def _annotate_paragraph(para, change: ClassifiedChange, doc: Document):
     """Highlight a paragraph and add a comment."""
-    color = IMPACT_COLORS.get(change.impact, RGBColor(255, 255, 0))
+    fill = IMPACT_HEX.get(change.impact, DEFAULT_HEX)
+    
+    # Clear existing highlights (they would hide the shading) in one scan
+    for highlight in list(para._element.iterfind(_RUN_HIGHLIGHT_PATH)):
+        highlight.getparent().remove(highlight)
     
     for run in para.runs:
-        run.font.highlight_color = None
-        _set_run_highlight(run, color)
+        _set_run_highlight(run, fill)
     
     comment_text = _format_comment(change)
     _add_comment_to_paragraph(para, comment_text, doc)
@@ -117,7 +153,7 @@ def _annotate_paragraph(para, change: ClassifiedChange, doc: Document):
 
 def _annotate_table(table, change: ClassifiedChange, doc: Document):
     """Highlight changed cells in a table and add a comment."""
-    color = IMPACT_COLORS.get(change.impact, RGBColor(255, 255, 0))
+    fill = IMPACT_HEX.get(change.impact, DEFAULT_HEX)
     
     changed_cells = _find_changed_cells(table, change)
     
@@ -125,11 +161,11 @@ def _annotate_table(table, change: ClassifiedChange, doc: Document):
         for row_idx, col_idx in changed_cells:
             if row_idx < len(table.rows) and col_idx < len(table.rows[row_idx].cells):
                 cell = table.rows[row_idx].cells[col_idx]
-                _highlight_cell(cell, color)
+                _highlight_cell(cell, fill)
     else:
         for row in table.rows:
             for cell in row.cells:
-                _highlight_cell(cell, color)
+                _highlight_cell(cell, fill)
     
     if table.rows and table.rows[0].cells:
         first_cell = table.rows[0].cells[0]
@@ -145,70 +181,110 @@ def _find_changed_cells(table, change: ClassifiedChange) -> List[tuple]:
     if not change.word_changes:
         return changed_cells
     
-    changed_values = set()
-    for wc in change.word_changes:
-        if wc.old_text:
-            changed_values.add(wc.old_text.strip())
-        if wc.new_text:
-            changed_values.add(wc.new_text.strip())
+    # Non-empty values, computed once per change (an empty value would match
+    # every cell). A value containing a shorter value is redundant for the
+    # forward scan, since the shorter one matches wherever it does.
+    changed_values = sorted({
+        text.strip()
+        for wc in change.word_changes
+        for text in (wc.old_text, wc.new_text)
+        if text and text.strip()
+    })
+    if not changed_values:
+        return changed_cells
+    
+    scan_values = [
+        val for val in changed_values
+        if not any(other != val and other in val for other in changed_values)
+    ]
+    automaton = _build_automaton(scan_values)
     
     for row_idx, row in enumerate(table.rows):
         for col_idx, cell in enumerate(row.cells):
             cell_text = cell.text.strip()
-            for val in changed_values:
-                if val in cell_text or cell_text in val:
-                    changed_cells.append((row_idx, col_idx))
-                    break
+            if automaton is not None:
+                # One C-level scan against every value
+                matched = next(automaton.iter(cell_text), None) is not None
+            else:
+                matched = any(val in cell_text for val in scan_values)
+            
+            # Reverse check: cell text is part of a changed value
+            if not matched and cell_text:
+                matched = any(cell_text in val for val in changed_values)
+            
+            if matched:
+                changed_cells.append((row_idx, col_idx))
     
     return changed_cells
 
 
-def _highlight_cell(cell, color: RGBColor):
+def _build_automaton(values: List[str]):
+    """Build an Aho-Corasick automaton over the values, or None if unavailable."""
+    if ahocorasick is None or not values:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for val in values:
+        automaton.add_word(val, val)
+    automaton.make_automaton()
+    return automaton
+
+
+def _highlight_cell(cell, fill: str):
     """Apply background shading to a table cell."""
     for para in cell.paragraphs:
         for run in para.runs:
-            _set_run_highlight(run, color)
-    _set_cell_shading(cell, color)
+            _set_run_highlight(run, fill)
+    _set_cell_shading(cell, fill)
 
 
-def _set_cell_shading(cell, color: RGBColor):
-    """Set background color for a table cell."""
-    tc = cell._tc
-    tcPr = tc.get_or_add_tcPr()
-    shd = OxmlElement('w:shd')
-    shd.set(qn('w:fill'), f'{color[0]:02x}{color[1]:02x}{color[2]:02x}')
-    tcPr.append(shd)
+def _set_cell_shading(cell, fill: str):
+    """Set background color (hex string, e.g. 'ff6666') for a table cell."""
+    tcPr = _get_or_insert_first(cell._tc, _W_TCPR)
+    etree.SubElement(tcPr, _W_SHD, {_W_FILL: fill})
 
 
-def _set_run_highlight(run, color: RGBColor):
-    """Set background highlight for a text run using shading."""
-    rPr = run._r.get_or_add_rPr()
-    shd = OxmlElement('w:shd')
-    shd.set(qn('w:val'), 'clear')
-    shd.set(qn('w:color'), 'auto')
-    shd.set(qn('w:fill'), f'{color[0]:02x}{color[1]:02x}{color[2]:02x}')
-    rPr.append(shd)
+def _set_run_highlight(run, fill: str):
+    """Set background highlight (hex string) for a text run using shading."""
+    rPr = _get_or_insert_first(run._r, _W_RPR)
+    etree.SubElement(rPr, _W_SHD, {
+        _W_VAL: 'clear',
+        _W_COLOR: 'auto',
+        _W_FILL: fill
+    })
+
+
+def _get_or_insert_first(parent, tag: str):
+    """Return the parent's `tag` child, creating it as the first child (w:rPr / w:tcPr position)."""
+    child = parent.find(tag)
+    if child is None:
+        child = parent.makeelement(tag, {})
+        parent.insert(0, child)
+    return child
+
+
+# Vietnamese labels for comment headers
+_IMPACT_VN = {
+    "critical": "NGHIÊM TRỌNG",
+    "medium": "TRUNG BÌNH",
+    "low": "THẤP"
+}
 
 
 def _format_comment(change: ClassifiedChange) -> str:
     """Format the comment text for a change (simple format)."""
-    impact_vn = {
-        "critical": "NGHIÊM TRỌNG",
-        "medium": "TRUNG BÌNH", 
-        "low": "THẤP"
-    }.get(change.impact.value, change.impact.value.upper())
-    
-    original = change.original[:100] if change.original else '(không có)'
-    if change.original and len(change.original) > 100:
-        original += '...'
-        
-    modified = change.modified[:100] if change.modified else '(không có)'
-    if change.modified and len(change.modified) > 100:
-        modified += '...'
+    impact_vn = _IMPACT_VN.get(change.impact.value, change.impact.value.upper())
     
     return f"""[{impact_vn}]
-Gốc: {original}
-Mới: {modified}"""
+Gốc: {_truncate(change.original)}
+Mới: {_truncate(change.modified)}"""
+
+
+def _truncate(text: str | None, limit: int = 100) -> str:
+    """Shorten text for a comment, or a placeholder if there is none."""
+    if not text:
+        return '(không có)'
+    return text[:limit] + '...' if len(text) > limit else text
 
 
 def _add_comment_to_paragraph(para, comment_text: str, doc: Document):
@@ -5,14 +5,34 @@ Hybrid approach: rule-based for numbers, LLM for semantic analysis.
 
 import re
 import json
+import logging
 import time
-from typing import List, Tuple
+import asyncio
+from functools import lru_cache
+from typing import List, Tuple, TYPE_CHECKING
 from dataclasses import dataclass
 
-from openai import OpenAI
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+try:
+    import hyperscan
+except ImportError:  # Optional accelerator; no wheels for every platform
+    hyperscan = None
 
 from app.config import settings
 from app.models import Change, ClassifiedChange, ImpactLevel, ChangeType
+from app.utils import RateLimiter, llm_cache
+
+if TYPE_CHECKING:  # openai is imported lazily; it dominates cold-start time
+    from openai import Timeout
+
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -50,6 +70,68 @@ RISK_STATEMENTS = {
     "Giá trị số thay đổi": "Thay đổi dữ liệu số - cần kiểm tra với nguồn gốc",
 }
 
+# Compiled once at import. The combined alternation rejects the common
+# "no number" case in a single scan; the ordered list picks the reason.
+_COMPILED_PATTERNS = [
+    (re.compile(pattern, re.IGNORECASE), reason)
+    for pattern, reason in CRITICAL_PATTERNS
+]
+_COMBINED_RE = re.compile(
+    "|".join(f"(?:{pattern})" for pattern, _ in CRITICAL_PATTERNS),
+    re.IGNORECASE
+)
+_NON_WORD_RE = re.compile(r'[^\w]')
+
+# ASCII characters outside \w, for a C-level str.translate fast path
+_ASCII_NON_WORD_TABLE = str.maketrans({
+    chr(code): None
+    for code in range(128)
+    if not (chr(code).isalnum() or chr(code) == '_')
+})
+
+
+def _build_hyperscan_db():
+    """
+    Compile CRITICAL_PATTERNS into one Hyperscan DFA, or None if unavailable.
+    
+    Hyperscan rejects \\b in Unicode mode, so word boundaries are dropped
+    and every pattern is compiled with UCP (Unicode \\d, like Python's re).
+    Removing an assertion only widens the match set, so the result is a
+    superset of Python's matches, which is safe for a prefilter.
+    """
+    if hyperscan is None:
+        return None
+    
+    flags = (
+        hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8
+        | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+    )
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.replace(r'\b', '').encode() for pattern, _ in CRITICAL_PATTERNS],
+            ids=list(range(len(CRITICAL_PATTERNS))),
+            elements=len(CRITICAL_PATTERNS),
+            flags=[flags] * len(CRITICAL_PATTERNS),
+        )
+    except hyperscan.error as e:
+        logger.warning("Hyperscan unavailable, falling back to re: %s", e)
+        return None
+    return db
+
+
+_HYPERSCAN_DB = _build_hyperscan_db()
+
+
+def _may_match_critical(text: str) -> bool:
+    """Single-pass check whether any CRITICAL pattern can match the text."""
+    if _HYPERSCAN_DB is None:
+        return _COMBINED_RE.search(text) is not None
+    
+    matched = []
+    _HYPERSCAN_DB.scan(text.encode(), match_event_handler=lambda pattern_id, *_: matched.append(pattern_id))
+    return bool(matched)
+
 
 # ============================================================
 # RULE-BASED CLASSIFIER
@@ -82,16 +164,31 @@ def classify_by_rules(change: Change) -> tuple[ImpactLevel | None, str, str]:
             "Không ảnh hưởng đến nghiệp vụ - chỉ thay đổi định dạng"
         )
     
-    # Check for CRITICAL patterns (numbers)
-    for pattern, reason in CRITICAL_PATTERNS:
-        if re.search(pattern, text_to_analyze, re.IGNORECASE):
-            risk = RISK_STATEMENTS.get(reason, "Phát hiện thay đổi - cần xem xét")
-            return (ImpactLevel.CRITICAL, reason, risk)
+    # Check for CRITICAL patterns (numbers), in priority order
+    reason = _critical_reason(text_to_analyze)
+    if reason is not None:
+        risk = RISK_STATEMENTS.get(reason, "Phát hiện thay đổi - cần xem xét")
+        return (ImpactLevel.CRITICAL, reason, risk)
     
     # No rule matched - needs LLM
     return (None, "", "")
 
 
+@lru_cache(maxsize=4096)
+def _critical_reason(text: str) -> str | None:
+    """
+    Reason of the first CRITICAL pattern matching the text, or None.
+    
+    Cached by text: repeated edits (the same figure changed throughout a
+    contract, boilerplate clauses) are only scanned once.
+    """
+    if _may_match_critical(text):
+        for pattern, reason in _COMPILED_PATTERNS:
+            if pattern.search(text):
+                return reason
+    return None
+
+
 def _is_trivial_change(change: Change) -> bool:
     """Check if change is trivial (whitespace, punctuation only)."""
     if not change.word_changes:
@@ -101,8 +198,8 @@ def _is_trivial_change(change: Change) -> bool:
         old = wc.old_text.strip()
         new = wc.new_text.strip()
         
-        old_alpha = re.sub(r'[^\w]', '', old)
-        new_alpha = re.sub(r'[^\w]', '', new)
+        old_alpha = _strip_non_word(old)
+        new_alpha = _strip_non_word(new)
         
         if old_alpha.lower() != new_alpha.lower():
             return False
@@ -110,31 +207,235 @@ def _is_trivial_change(change: Change) -> bool:
     return True
 
 
+def _strip_non_word(text: str) -> str:
+    """Remove non-word characters (same result as re.sub(r'[^\\w]', '', text))."""
+    if text.isascii():
+        return text.translate(_ASCII_NON_WORD_TABLE)
+    # Unicode \w (e.g. Vietnamese letters) needs the regex
+    return _NON_WORD_RE.sub('', text)
+
+
 # ============================================================
 # LLM CLASSIFIER (OpenAI GPT-4o)
 # ============================================================
 
+_backoff = wait_random_exponential(min=1, max=30)
+
+
+def _is_retryable(error: BaseException) -> bool:
+    """Transient OpenAI failures worth retrying; anything else fails the chunk."""
+    import openai
+    
+    return isinstance(error, (
+        openai.RateLimitError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.InternalServerError,
+    ))
+
+
+def _wait_for_retry(retry_state) -> float:
+    """Honor the server's Retry-After header, else exponential backoff with jitter."""
+    error = retry_state.outcome.exception()
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), 30)
+        except ValueError:  # HTTP-date form
+            pass
+    return _backoff(retry_state)
+
+
+# Structured output: the server constrains the model to this shape
+_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "impacts",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer"},
+                            "impact": {"type": "string", "enum": ["critical", "medium", "low"]},
+                        },
+                        "required": ["id", "impact"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_IMPACT_MAP = {
+    "critical": ImpactLevel.CRITICAL,
+    "medium": ImpactLevel.MEDIUM,
+    "low": ImpactLevel.LOW,
+    "high": ImpactLevel.CRITICAL
+}
+
+_DEFAULT_REASONS = {
+    ImpactLevel.CRITICAL: ("Thay đổi quan trọng", "Cần xem xét kỹ"),
+    ImpactLevel.MEDIUM: ("Thay đổi có ý nghĩa", "Cần xem xét"),
+    ImpactLevel.LOW: ("Thay đổi nhỏ", "Ảnh hưởng thấp")
+}
+
+
+# User prompt pieces, parsed once and filled with str.format_map
+_DOC_TYPE_VN = {
+    "general": "tài liệu chung",
+    "contract": "hợp đồng",
+    "policy": "chính sách",
+    "report": "báo cáo",
+    "research_paper": "bài nghiên cứu"
+}
+
+_WORD_CHANGE_TEMPLATES = {
+    "replaced": "THAY ĐỔI: '{old_text}' → '{new_text}'",
+    "added": "THÊM: '{new_text}'",
+    "deleted": "XÓA: '{old_text}'",
+}
+
+_ORIGINAL_CONTEXT_TEMPLATE = "\nNội dung gốc: {text}"
+_MODIFIED_CONTEXT_TEMPLATE = "\nNội dung mới: {text}"
+
+# Full block text is only sent when the word-level diff may not tell the story
+_CONTEXT_SIMILARITY_THRESHOLD = 0.75
+_CONTEXT_MAX_CHARS = 150
+
+
+def _needs_context(change: Change) -> bool:
+    """Whether the LLM needs the block text besides the word changes."""
+    return (
+        not change.word_changes
+        or (change.similarity is not None and change.similarity < _CONTEXT_SIMILARITY_THRESHOLD)
+        or change.block_type == "table"
+    )
+
+
+_CHANGE_TEMPLATE = "#{change_id} [{block_type}, {location}]:\n{diff_summary}{context_info}"
+
+_USER_PROMPT_TEMPLATE = """Loại tài liệu: {doc_type_vn}
+
+CÁC THAY ĐỔI CẦN PHÂN LOẠI:
+
+{changes_block}
+
+Trả về JSON CHỈ với id và impact (không cần reasoning/risk):
+{{"results": [{{"id": 1, "impact": "critical"}}, {{"id": 2, "impact": "medium"}}]}}"""
+
+
+class _JsonObjectScanner:
+    """
+    Incrementally pull innermost JSON objects out of a streamed response.
+    
+    Tracks brace depth outside of string literals; each time an object
+    with no nested object closes, it is decoded and returned. Works the
+    same whether the model wraps its array in an object or a code fence.
+    """
+    
+    def __init__(self):
+        self._parts: List[str] = []
+        self._buffer = ""
+        self._pos = 0
+        self._starts: List[int] = []    # Offsets of currently open objects
+        self._leaf = False              # Innermost open object has no children yet
+        self._in_string = False
+        self._escaped = False
+    
+    @property
+    def text(self) -> str:
+        """Everything received so far."""
+        return "".join(self._parts)
+    
+    def feed(self, delta: str) -> List[dict]:
+        """Consume a chunk of text and return any objects it completed."""
+        self._parts.append(delta)
+        self._buffer += delta
+        completed = []
+        
+        buffer = self._buffer
+        for pos in range(self._pos, len(buffer)):
+            char = buffer[pos]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._starts.append(pos)
+                self._leaf = True
+            elif char == "}" and self._starts:
+                start = self._starts.pop()
+                if self._leaf:
+                    try:
+                        completed.append(json.loads(buffer[start:pos + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                self._leaf = False
+        
+        # Keep only the text an open object may still need
+        cut = self._starts[0] if self._starts else len(buffer)
+        self._buffer = buffer[cut:]
+        self._starts = [start - cut for start in self._starts]
+        self._pos = len(self._buffer)
+        return completed
+
+
+# Shared across requests so concurrent comparisons respect one RPM/TPM budget
+_rate_limiter = RateLimiter(
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+)
+
+
 class LLMClassifier:
     """Classifies changes using OpenAI GPT-4o based on business impact."""
     
     def __init__(self, api_key: str = None):
+        from openai import AsyncOpenAI, Timeout
+        
         self.api_key = api_key or settings.OPENAI_API_KEY
-        self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            timeout=Timeout(settings.OPENAI_TIMEOUT, connect=settings.OPENAI_CONNECT_TIMEOUT),
+            max_retries=0,  # Retries are handled by _create_with_retry
+        ) if self.api_key else None
         self.model = settings.OPENAI_MODEL
     
-    def classify_batch(
+    async def classify_batch(
         self, 
         changes: List[Change], 
         document_type: str = "general"
-    ) -> Tuple[dict[int, tuple[ImpactLevel, str, str]], int]:
+    ) -> Tuple[dict[int, tuple[ImpactLevel, str, str]], int, int]:
         """
         Classify changes using LLM based on business impact.
         
+        Changes already answered for the same content are served from the
+        LLM cache, and changes sharing a cache key within the batch (repeated
+        cells, boilerplate clauses) are sent once. The rest are split into chunks of LLM_BATCH_SIZE, one
+        request per chunk; requests run concurrently, bounded by
+        LLM_CONCURRENCY and the shared rate limiter. A failed chunk falls
+        back to MEDIUM for its own changes only.
+        
         Returns:
-            Tuple of (Dict mapping change_id -> (impact, reasoning, risk_analysis), llm_time_ms)
+            Tuple of (Dict mapping change_id -> (impact, reasoning, risk_analysis),
+                      llm_time_ms, llm_calls) where llm_calls counts cache misses only
         """
         if not changes:
-            return {}, 0
+            return {}, 0, 0
         
         if not self.client:
             return {
@@ -144,43 +445,155 @@ class LLMClassifier:
                     "Cần xem xét thủ công"
                 )
                 for c in changes
-            }, 0
+            }, 0, 0
+        
+        results = {}
+        misses = {}  # cache key -> changes sharing it, first one is sent
+        # SQLite-backed lookups block, so keep them off the event loop
+        keys = {c.change_id: self._cache_key(c, document_type) for c in changes}
+        cache_hits = await asyncio.to_thread(llm_cache.get_many, keys.values())
+        for c in changes:
+            cached = cache_hits.get(keys[c.change_id])
+            if cached is not None:
+                impact, reasoning, risk = cached
+                results[c.change_id] = (ImpactLevel(impact), reasoning, risk)
+            else:
+                misses.setdefault(keys[c.change_id], []).append(c)
+        
+        if not misses:
+            return results, 0, 0
+        to_send = [group[0] for group in misses.values()]
+        
+        semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+        
+        async def run(chunk: List[Change]) -> dict[int, tuple[ImpactLevel, str, str]]:
+            async with semaphore:
+                return await self._classify_chunk(chunk, document_type)
+        
+        # Track LLM API wall time (requests overlap, so this is ~max latency)
+        llm_start = time.time()
+        batch_size = settings.LLM_BATCH_SIZE
+        chunks = [to_send[i:i + batch_size] for i in range(0, len(to_send), batch_size)]
+        chunk_results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        llm_time_ms = int((time.time() - llm_start) * 1000)
+        
+        for chunk_result in chunk_results:
+            results.update(chunk_result)
+        
+        # Copy each representative's answer to its duplicates
+        for group in misses.values():
+            if group[0].change_id in results:
+                for c in group[1:]:
+                    results[c.change_id] = results[group[0].change_id]
+        
+        miss_count = sum(len(group) for group in misses.values())
+        logger.debug(
+            "Parsed %d classifications (%d cached, %d duplicates) in %dms",
+            len(results), len(changes) - miss_count, miss_count - len(to_send), llm_time_ms
+        )
+        return results, llm_time_ms, len(chunk_results)
+    
+    async def _classify_chunk(
+        self,
+        changes: List[Change],
+        document_type: str
+    ) -> dict[int, tuple[ImpactLevel, str, str]]:
+        """
+        Classify one group of changes in a single streamed API call.
         
+        Classifications are parsed as soon as each JSON object completes in
+        the stream, so a failure mid-stream only falls back to MEDIUM for the
+        changes not yet answered. Whatever the model did answer is cached in
+        one write once the stream ends.
+        """
         prompt = self._build_prompt(changes, document_type)
         system_prompt = self._get_system_prompt()
+        results = {}
+        error = None
         
         try:
-            # Track LLM API call time
-            llm_start = time.time()
+            await _rate_limiter.acquire(self._estimate_tokens(system_prompt, prompt))
             
-            response = self.client.chat.completions.create(
+            stream = await self._create_with_retry(
                 model=self.model,
-                max_tokens=500,
+                max_tokens=settings.OPENAI_MAX_TOKENS,
                 temperature=0,
+                timeout=self._request_timeout(prompt),
+                stream=True,
+                response_format=_RESPONSE_FORMAT,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ]
             )
             
-            llm_time_ms = int((time.time() - llm_start) * 1000)
-            
-            response_text = response.choices[0].message.content
-            print(f"LLM response received in {llm_time_ms}ms: {response_text[:200]}...")
-            parsed_results = self._parse_response(response_text, changes)
-            print(f"Parsed {len(parsed_results)} classifications from LLM")
-            return parsed_results, llm_time_ms
+            scanner = _JsonObjectScanner()
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                for item in scanner.feed(delta):
+                    parsed = self._parse_item(item)
+                    if parsed is not None:
+                        change_id, classification = parsed
+                        results[change_id] = classification
             
+            response_text = scanner.text
+            logger.debug("LLM response received: %.200s...", response_text)
+            if not results:
+                # Nothing recognizable streamed; try the whole body once more
+                results = self._parse_response(response_text, changes)
+        
         except Exception as e:
-            print(f"LLM classification failed: {e}")
-            return {
-                c.change_id: (
-                    ImpactLevel.MEDIUM,
-                    f"Lỗi LLM: {str(e)[:50]}",
-                    "Cần xem xét thủ công"
-                )
-                for c in changes
-            }, 0
+            logger.warning("LLM classification failed: %s", e)
+            error = e
+        
+        answered = [
+            (self._cache_key(c, document_type), results[c.change_id])
+            for c in changes
+            if c.change_id in results
+        ]
+        if answered:
+            await asyncio.to_thread(llm_cache.set_many, answered)
+        
+        if error is not None:
+            fallback = (
+                ImpactLevel.MEDIUM,
+                f"Lỗi LLM: {str(error)[:50]}",
+                "Cần xem xét thủ công"
+            )
+            for c in changes:
+                results.setdefault(c.change_id, fallback)
+        return results
+    
+    @retry(
+        wait=_wait_for_retry,
+        stop=stop_after_attempt(settings.OPENAI_MAX_RETRIES + 1),
+        retry=retry_if_exception(_is_retryable),
+        reraise=True,
+    )
+    async def _create_with_retry(self, **kwargs):
+        """Chat completion call, retried on rate limits, timeouts and 5xx."""
+        return await self.client.chat.completions.create(**kwargs)
+    
+    def _cache_key(self, change: Change, document_type: str) -> str:
+        """LLM cache key for a change's content under this model."""
+        return llm_cache.make_key(
+            self.model, document_type, change.block_type, change.original, change.modified
+        )
+    
+    def _estimate_tokens(self, system_prompt: str, prompt: str) -> int:
+        """Rough token cost of a call (Vietnamese averages ~3 chars/token)."""
+        return (len(system_prompt) + len(prompt)) // 3 + settings.OPENAI_MAX_TOKENS
+    
+    def _request_timeout(self, prompt: str) -> "Timeout":
+        """Per-call timeout, scaled up for long prompts (+1s per 4k chars)."""
+        from openai import Timeout
+        
+        return Timeout(
+            settings.OPENAI_TIMEOUT + len(prompt) // 4000,
+            connect=settings.OPENAI_CONNECT_TIMEOUT,
+        )
     
     def _get_system_prompt(self) -> str:
         """System prompt for classification."""
@@ -208,56 +621,51 @@ LOW (Thấp):
 - Thay đổi định dạng
 - Thay từ đồng nghĩa có cùng ý nghĩa
 
-CHỈ TRẢ VỀ JSON ARRAY với format: [{"id": 1, "impact": "critical"}, {"id": 2, "impact": "low"}]
+CHỈ TRẢ VỀ JSON với format: {"results": [{"id": 1, "impact": "critical"}, {"id": 2, "impact": "low"}]}
 KHÔNG cần reasoning hay risk - chỉ cần id và impact."""
-    
+
     def _build_prompt(self, changes: List[Change], document_type: str) -> str:
         """Build the user prompt with change details."""
-        doc_type_vn = {
-            "general": "tài liệu chung",
-            "contract": "hợp đồng",
-            "policy": "chính sách",
-            "report": "báo cáo",
-            "research_paper": "bài nghiên cứu"
-        }.get(document_type, document_type)
-        
         change_lines = []
+        context_included = 0
         for c in changes:
             if c.word_changes:
-                parts = []
-                for wc in c.word_changes:
-                    if wc.change_type == "replaced":
-                        parts.append(f"THAY ĐỔI: '{wc.old_text}' → '{wc.new_text}'")
-                    elif wc.change_type == "added":
-                        parts.append(f"THÊM: '{wc.new_text}'")
-                    elif wc.change_type == "deleted":
-                        parts.append(f"XÓA: '{wc.old_text}'")
-                diff_summary = "; ".join(parts)
+                diff_summary = "; ".join(
+                    _WORD_CHANGE_TEMPLATES[wc.change_type].format_map(
+                        {"old_text": wc.old_text, "new_text": wc.new_text}
+                    )
+                    for wc in c.word_changes
+                    if wc.change_type in _WORD_CHANGE_TEMPLATES
+                )
             else:
                 diff_summary = c.diff_text or "Thay đổi không xác định"
             
             context_info = ""
-            if c.original and len(c.original) < 500:
-                context_info += f"\nNội dung gốc: {c.original[:300]}"
-            if c.modified and len(c.modified) < 500:
-                context_info += f"\nNội dung mới: {c.modified[:300]}"
+            if _needs_context(c):
+                if c.original and len(c.original) < 500:
+                    context_info += _ORIGINAL_CONTEXT_TEMPLATE.format_map(
+                        {"text": c.original[:_CONTEXT_MAX_CHARS]}
+                    )
+                if c.modified and len(c.modified) < 500:
+                    context_info += _MODIFIED_CONTEXT_TEMPLATE.format_map(
+                        {"text": c.modified[:_CONTEXT_MAX_CHARS]}
+                    )
+            if context_info:
+                context_included += 1
             
-            change_lines.append(
-                f"#{c.change_id} [{c.block_type}, {c.location}]:\n{diff_summary}{context_info}"
-            )
-        
-        changes_block = "\n\n".join(change_lines)
+            change_lines.append(_CHANGE_TEMPLATE.format_map({
+                "change_id": c.change_id,
+                "block_type": c.block_type,
+                "location": c.location,
+                "diff_summary": diff_summary,
+                "context_info": context_info,
+            }))
         
-        return f"""Loại tài liệu: {doc_type_vn}
-
-CÁC THAY ĐỔI CẦN PHÂN LOẠI:
-
-{changes_block}
-
-Trả về JSON array CHỈ với id và impact (không cần reasoning/risk):
-[{{"id": 1, "impact": "critical"}}, {{"id": 2, "impact": "medium"}}]
-
-JSON array:"""
+        logger.debug("Context included for %d/%d changes", context_included, len(changes))
+        return _USER_PROMPT_TEMPLATE.format_map({
+            "doc_type_vn": _DOC_TYPE_VN.get(document_type, document_type),
+            "changes_block": "\n\n".join(change_lines),
+        })
     
     def _parse_response(
         self, 
@@ -265,56 +673,51 @@ JSON array:"""
         changes: List[Change]
     ) -> dict[int, tuple[ImpactLevel, str, str]]:
         """Parse LLM response - just impact levels."""
-        text = response_text.strip()
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
-        
         try:
-            parsed = json.loads(text)
-        except json.JSONDecodeError as e:
-            print(f"JSON parse error: {e}")
-            print(f"Raw LLM response: {response_text}")
+            parsed = json.loads(response_text)["results"]
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning("JSON parse error: %r", e)
+            logger.debug("Raw LLM response: %s", response_text)
             return {}
         
-        impact_map = {
-            "critical": ImpactLevel.CRITICAL,
-            "medium": ImpactLevel.MEDIUM,
-            "low": ImpactLevel.LOW,
-            "high": ImpactLevel.CRITICAL
-        }
-        
         results = {}
         for item in parsed:
-            # Handle both string and integer IDs from LLM
-            change_id = item.get("id")
-            if change_id is not None:
-                change_id = int(change_id)  # Ensure integer for matching
-            impact_str = item.get("impact", "medium").lower()
-            impact = impact_map.get(impact_str, ImpactLevel.MEDIUM)
-            
-            # Default reasoning based on impact level
-            default_reasons = {
-                ImpactLevel.CRITICAL: ("Thay đổi quan trọng", "Cần xem xét kỹ"),
-                ImpactLevel.MEDIUM: ("Thay đổi có ý nghĩa", "Cần xem xét"),
-                ImpactLevel.LOW: ("Thay đổi nhỏ", "Ảnh hưởng thấp")
-            }
-            reasoning, risk = default_reasons.get(impact, ("", ""))
-            
-            results[change_id] = (impact, reasoning, risk)
+            parsed_item = self._parse_item(item)
+            if parsed_item is not None:
+                change_id, classification = parsed_item
+                results[change_id] = classification
         
         return results
+    
+    def _parse_item(self, item) -> Tuple[int, tuple[ImpactLevel, str, str]] | None:
+        """
+        Turn one {"id", "impact"} object into (change_id, classification).
+        
+        Returns None for anything without a usable id, e.g. an empty
+        {"results": []} wrapper seen as a leaf by the stream scanner.
+        """
+        if not isinstance(item, dict):
+            return None
+        
+        # Handle both string and integer IDs from LLM
+        try:
+            change_id = int(item["id"])  # Ensure integer for matching
+        except (KeyError, TypeError, ValueError):
+            return None
+        impact_str = str(item.get("impact", "medium")).lower()
+        impact = _IMPACT_MAP.get(impact_str, ImpactLevel.MEDIUM)
+        
+        # Default reasoning based on impact level
+        reasoning, risk = _DEFAULT_REASONS.get(impact, ("", ""))
+        
+        return change_id, (impact, reasoning, risk)
 
 
 # ============================================================
 # HYBRID PIPELINE
 # ============================================================
 
-def classify_changes(
+async def classify_changes(
     changes: List[Change],
     document_type: str = "general",
     api_key: str = None
@@ -337,16 +740,8 @@ def classify_changes(
         impact, reasoning, risk = classify_by_rules(change)
         
         if impact is not None:
-            classified.append(ClassifiedChange(
-                change_id=change.change_id,
-                change_type=change.change_type,
-                block_type=change.block_type,
-                location=change.location,
-                original=change.original,
-                modified=change.modified,
-                similarity=change.similarity,
-                diff_text=change.diff_text,
-                word_changes=change.word_changes,
+            classified.append(ClassifiedChange.from_change(
+                change,
                 impact=impact,
                 reasoning=reasoning,
                 risk_analysis=risk,
@@ -358,29 +753,23 @@ def classify_changes(
     # Layer 2: LLM classification for ambiguous cases
     if needs_llm:
         llm = LLMClassifier(api_key=api_key)
-        print(f"Sending {len(needs_llm)} changes to LLM ({llm.model})...")
-        llm_results, llm_time_ms = llm.classify_batch(needs_llm, document_type)
-        llm_calls = 1 if needs_llm else 0  # Currently batches all in one call
+        logger.debug("Sending %d changes to LLM (%s)...", len(needs_llm), llm.model)
+        llm_results, llm_time_ms, llm_calls = await llm.classify_batch(needs_llm, document_type)
         
         for change in needs_llm:
             if change.change_id in llm_results:
                 impact, reasoning, risk = llm_results[change.change_id]
             else:
-                print(f"Warning: change_id {change.change_id} not found in LLM results. Available: {list(llm_results.keys())}")
+                logger.warning(
+                    "change_id %s not found in LLM results. Available: %s",
+                    change.change_id, list(llm_results)
+                )
                 impact = ImpactLevel.MEDIUM
                 reasoning = "Không thể phân loại"
                 risk = "Cần xem xét thủ công"
             
-            classified.append(ClassifiedChange(
-                change_id=change.change_id,
-                change_type=change.change_type,
-                block_type=change.block_type,
-                location=change.location,
-                original=change.original,
-                modified=change.modified,
-                similarity=change.similarity,
-                diff_text=change.diff_text,
-                word_changes=change.word_changes,
+            classified.append(ClassifiedChange.from_change(
+                change,
                 impact=impact,
                 reasoning=reasoning,
                 risk_analysis=risk,
@@ -4,10 +4,38 @@ Compares two documents and identifies changes at block and word level.
 """
 
 from typing import List
-from difflib import SequenceMatcher
+from functools import lru_cache
 
+from app.config import settings
 from app.models import ContentBlock, Change, WordChange, ChangeType
 
+try:
+    # C port of difflib with identical results, ~15x faster on long text
+    from cydifflib import SequenceMatcher
+except ImportError:  # Optional accelerator
+    from difflib import SequenceMatcher
+
+try:
+    from rapidfuzz.distance import Indel
+except ImportError:  # Optional accelerator; difflib is used instead
+    Indel = None
+
+try:
+    from rapidfuzz import fuzz
+    from rapidfuzz.process import cdist
+except ImportError:
+    fuzz = cdist = None
+
+
+# MinHash-LSH candidate prefilter for large replace regions
+LSH_MIN_BLOCKS = 20       # Below this on either side, scoring all pairs is cheaper
+LSH_NUM_PERM = 64
+LSH_THRESHOLD = 0.4       # Jaccard over 3-word shingles
+LSH_MAX_CANDIDATES = 5    # Exact-scored v2 blocks per v1 block
+
+# Above this many v1 x v2 pairs, score them all at once with rapidfuzz (USE_RAPIDFUZZ)
+CDIST_MIN_PAIRS = 10_000
+
 
 def diff_documents(blocks_v1: List[ContentBlock], blocks_v2: List[ContentBlock]) -> List[Change]:
     """
@@ -28,12 +56,10 @@ def diff_documents(blocks_v1: List[ContentBlock], blocks_v2: List[ContentBlock])
     contents_v1 = [b.content for b in blocks_v1]
     contents_v2 = [b.content for b in blocks_v2]
     
-    matcher = SequenceMatcher(None, contents_v1, contents_v2)
-    
     changes = []
     change_id = 1
     
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in _get_opcodes(contents_v1, contents_v2):
         
         if tag == 'equal':
             continue
@@ -131,6 +157,103 @@ def diff_documents(blocks_v1: List[ContentBlock], blocks_v2: List[ContentBlock])
     return changes
 
 
+def _best_candidate(
+    b1: ContentBlock,
+    indices,
+    v2_blocks: List[ContentBlock],
+    used_v2: set,
+    v2_matchers: List[SequenceMatcher | None],
+    threshold: float,
+    best_idx: int | None,
+    best_sim: float
+) -> tuple[int | None, float]:
+    """
+    Best-scoring unused v2 block among indices, lowest index on ties.
+    
+    With rapidfuzz installed, candidates are visited in order of their Indel
+    similarity (2*LCS / total length). Matching blocks form a common
+    subsequence, so that bounds SequenceMatcher.ratio() from above: once a
+    bound drops below max(threshold, best_sim), no later candidate can win.
+    """
+    indices = [idx for idx in indices if idx not in used_v2]
+    bounds = None
+    if fuzz is not None and len(indices) > 1:
+        bounds = {idx: fuzz.ratio(b1.content, v2_blocks[idx].content) / 100 for idx in indices}
+        indices.sort(key=lambda idx: -bounds[idx])
+    
+    for idx in indices:
+        floor = max(threshold, best_sim)
+        if bounds is not None and bounds[idx] < floor - 1e-9:
+            break
+        sim = _pair_ratio(v2_matchers, idx, b1, v2_blocks[idx], floor)
+        if sim > best_sim or (sim == best_sim and best_idx is not None and idx < best_idx):
+            best_idx, best_sim = idx, sim
+    return best_idx, best_sim
+
+
+def _pair_ratio(
+    v2_matchers: List[SequenceMatcher | None],
+    idx: int,
+    b1: ContentBlock,
+    b2: ContentBlock,
+    floor: float
+) -> float:
+    """
+    SequenceMatcher(None, b1, b2).ratio(), reusing b2's cached matcher.
+    
+    Returns 0 without the full comparison when the length/histogram upper
+    bounds show the ratio cannot reach floor.
+    """
+    matcher = v2_matchers[idx]
+    if matcher is None:
+        matcher = SequenceMatcher(None, b1.content, b2.content, autojunk=False)
+        v2_matchers[idx] = matcher
+    else:
+        matcher.set_seq1(b1.content)
+    
+    if matcher.real_quick_ratio() < floor or matcher.quick_ratio() < floor:
+        return 0.0
+    return matcher.ratio()
+
+
+def _get_opcodes(a: List[str], b: List[str]) -> List[tuple[str, int, int, int, int]]:
+    """
+    difflib-style opcodes aligning two sequences.
+    
+    With USE_RAPIDFUZZ and rapidfuzz installed, alignment runs in C++ via
+    Indel. Indel only emits insert/delete, so adjacent runs between two
+    equal spans are folded into one 'replace', as difflib reports them.
+    """
+    if not (settings.USE_RAPIDFUZZ and Indel is not None):
+        return SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+    
+    opcodes = []
+    pending = None  # [i1, i2, j1, j2] of the current non-equal run
+    for op in Indel.opcodes(a, b):
+        if op.tag == 'equal':
+            if pending:
+                opcodes.append(_run_opcode(*pending))
+                pending = None
+            opcodes.append(('equal', op.src_start, op.src_end, op.dest_start, op.dest_end))
+        elif pending:
+            pending[1] = op.src_end
+            pending[3] = op.dest_end
+        else:
+            pending = [op.src_start, op.src_end, op.dest_start, op.dest_end]
+    if pending:
+        opcodes.append(_run_opcode(*pending))
+    return opcodes
+
+
+def _run_opcode(i1: int, i2: int, j1: int, j2: int) -> tuple[str, int, int, int, int]:
+    """Tag a non-equal run by which sides it spans."""
+    if i1 == i2:
+        return ('insert', i1, i2, j1, j2)
+    if j1 == j2:
+        return ('delete', i1, i2, j1, j2)
+    return ('replace', i1, i2, j1, j2)
+
+
 def _match_similar_blocks(
     v1_blocks: List[ContentBlock], 
     v2_blocks: List[ContentBlock],
@@ -143,22 +266,46 @@ def _match_similar_blocks(
     """
     results = []
     used_v2 = set()
+    scores = _score_matrix(v1_blocks, v2_blocks)
+    candidates = _lsh_candidates(v1_blocks, v2_blocks) if scores is None else None
+    # One matcher per v2 block, so its b2j index is built once for all v1 blocks
+    v2_matchers: List[SequenceMatcher | None] = [None] * len(v2_blocks)
     
-    for b1 in v1_blocks:
+    for i, b1 in enumerate(v1_blocks):
         best_match = None
         best_sim = 0
         
-        for idx, b2 in enumerate(v2_blocks):
-            if idx in used_v2:
-                continue
-            sim = SequenceMatcher(None, b1.content, b2.content).ratio()
-            if sim > best_sim:
-                best_sim = sim
-                best_match = (idx, b2)
+        if scores is not None:
+            # Used columns are masked to -1; argmax keeps the first best on ties
+            idx = int(scores[i].argmax())
+            if scores[i, idx] > 0:
+                best_sim = float(scores[i, idx])
+                best_match = (idx, v2_blocks[idx])
+                if best_sim >= threshold:
+                    scores[:, idx] = -1
+            candidates_i = ()
+        else:
+            scan = range(len(v2_blocks)) if candidates is None else candidates[i]
+            best_idx, best_sim = _best_candidate(
+                b1, scan, v2_blocks, used_v2, v2_matchers, threshold, None, 0
+            )
+            
+            if candidates is not None and best_sim < threshold:
+                # LSH only ranks; before calling b1 deleted, check every other v2 block
+                ranked = set(candidates[i])
+                rest = [idx for idx in range(len(v2_blocks)) if idx not in ranked]
+                best_idx, best_sim = _best_candidate(
+                    b1, rest, v2_blocks, used_v2, v2_matchers, threshold, best_idx, best_sim
+                )
+            
+            if best_idx is not None:
+                best_match = (best_idx, v2_blocks[best_idx])
         
         if best_match and best_sim >= threshold:
             used_v2.add(best_match[0])
-            diff_text, word_changes = get_word_level_diff(b1.content, best_match[1].content)
+            diff_text, word_changes = get_word_level_diff(
+                b1.content, best_match[1].content, b1.words, best_match[1].words
+            )
             results.append({
                 'type': 'modified',
                 'v1': b1,
@@ -202,27 +349,126 @@ def _match_similar_blocks(
     return results
 
 
-def get_word_level_diff(original: str, modified: str) -> tuple[str, List[WordChange]]:
+def _score_matrix(v1_blocks: List[ContentBlock], v2_blocks: List[ContentBlock]):
+    """
+    All-pairs similarity in [0, 1] from rapidfuzz's multithreaded cdist, or
+    None to score pairs individually (flag off, not installed, or small input).
+    
+    fuzz.ratio is the Indel (LCS) similarity, so scores can run slightly
+    above SequenceMatcher.ratio() for the same pair.
+    """
+    if not settings.USE_RAPIDFUZZ or cdist is None:
+        return None
+    if len(v1_blocks) * len(v2_blocks) <= CDIST_MIN_PAIRS:
+        return None
+    
+    try:
+        scores = cdist(
+            [b.content for b in v1_blocks],
+            [b.content for b in v2_blocks],
+            scorer=fuzz.ratio,
+            dtype=float,
+            workers=-1,
+        )
+    except ImportError:  # cdist imports numpy on first call
+        return None
+    scores /= 100.0
+    return scores
+
+
+def _lsh_candidates(
+    v1_blocks: List[ContentBlock],
+    v2_blocks: List[ContentBlock]
+) -> List[List[int]] | None:
+    """
+    For each v1 block, the v2 indices to score first (ascending), found via
+    MinHash-LSH on word shingles. None means score every pair.
+    
+    Candidates are a ranking, not a verdict: short blocks lose most shingles
+    to a one-word edit, so the caller falls back to the remaining blocks
+    when no candidate reaches the threshold.
+    """
+    if min(len(v1_blocks), len(v2_blocks)) < LSH_MIN_BLOCKS:
+        return None
+    datasketch = _load_datasketch()
+    if datasketch is None:
+        return None
+    
+    lsh = datasketch.MinHashLSH(threshold=LSH_THRESHOLD, num_perm=LSH_NUM_PERM)
+    v2_hashes = []
+    for idx, b2 in enumerate(v2_blocks):
+        minhash = _minhash(b2)
+        v2_hashes.append(minhash)
+        lsh.insert(idx, minhash)
+    
+    candidates = []
+    for b1 in v1_blocks:
+        minhash = _minhash(b1)
+        hits = lsh.query(minhash)
+        if len(hits) > LSH_MAX_CANDIDATES:
+            hits = sorted(hits, key=lambda idx: v2_hashes[idx].jaccard(minhash), reverse=True)
+            hits = hits[:LSH_MAX_CANDIDATES]
+        candidates.append(sorted(hits))
+    
+    return candidates
+
+
+@lru_cache(maxsize=None)
+def _load_datasketch():
+    """Import datasketch on first use (it pulls in scipy), or None if not installed."""
+    try:
+        import datasketch
+    except ImportError:  # Optional accelerator; falls back to scoring every pair
+        return None
+    return datasketch
+
+
+def _minhash(block: ContentBlock):
+    """MinHash signature of a block's lowercased 3-word shingles (words if shorter)."""
+    words = [word.lower() for word in block.words]
+    if len(words) < 3:
+        shingles = set(words) or {block.content}
+    else:
+        shingles = {' '.join(words[i:i + 3]) for i in range(len(words) - 2)}
+    
+    minhash = _load_datasketch().MinHash(num_perm=LSH_NUM_PERM)
+    minhash.update_batch([shingle.encode() for shingle in shingles])
+    return minhash
+
+
+def get_word_level_diff(
+    original: str,
+    modified: str,
+    orig_words: List[str] | None = None,
+    mod_words: List[str] | None = None
+) -> tuple[str, List[WordChange]]:
     """
     Compare two texts and return:
     1. Human-readable diff string: "word [-deleted-] [+added+] word"
     2. List of specific word changes
+    
+    orig_words/mod_words may be passed when the texts are already split
+    (e.g. ContentBlock.words) to skip re-splitting.
     """
-    orig_words = original.split()
-    mod_words = modified.split()
+    if orig_words is None:
+        orig_words = original.split()
+    if mod_words is None:
+        mod_words = modified.split()
     
-    matcher = SequenceMatcher(None, orig_words, mod_words)
+    # Whitespace-only edits: nothing to align
+    if orig_words == mod_words:
+        return ' '.join(orig_words), []
     
     diff_parts = []
     word_changes = []
     
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in _get_opcodes(orig_words, mod_words):
         if tag == 'equal':
             diff_parts.extend(orig_words[i1:i2])
             
         elif tag == 'delete':
-            deleted = orig_words[i1:i2]
-            diff_parts.append(f"[-{' '.join(deleted)}-]")
+            deleted = ' '.join(orig_words[i1:i2])
+            diff_parts.append(f"[-{deleted}-]")
             
             context_before = ' '.join(orig_words[max(0, i1-2):i1])
             context_after = ' '.join(orig_words[i2:i2+2])
@@ -230,14 +476,14 @@ def get_word_level_diff(original: str, modified: str) -> tuple[str, List[WordCha
             
             word_changes.append(WordChange(
                 change_type="deleted",
-                old_text=' '.join(deleted),
+                old_text=deleted,
                 new_text="",
                 context=context
             ))
             
         elif tag == 'insert':
-            added = mod_words[j1:j2]
-            diff_parts.append(f"[+{' '.join(added)}+]")
+            added = ' '.join(mod_words[j1:j2])
+            diff_parts.append(f"[+{added}+]")
             
             context_before = ' '.join(mod_words[max(0, j1-2):j1])
             context_after = ' '.join(mod_words[j2:j2+2])
@@ -246,15 +492,15 @@ def get_word_level_diff(original: str, modified: str) -> tuple[str, List[WordCha
             word_changes.append(WordChange(
                 change_type="added",
                 old_text="",
-                new_text=' '.join(added),
+                new_text=added,
                 context=context
             ))
             
         elif tag == 'replace':
-            old = orig_words[i1:i2]
-            new = mod_words[j1:j2]
-            diff_parts.append(f"[-{' '.join(old)}-]")
-            diff_parts.append(f"[+{' '.join(new)}+]")
+            old = ' '.join(orig_words[i1:i2])
+            new = ' '.join(mod_words[j1:j2])
+            diff_parts.append(f"[-{old}-]")
+            diff_parts.append(f"[+{new}+]")
             
             context_before = ' '.join(orig_words[max(0, i1-2):i1])
             context_after = ' '.join(orig_words[i2:i2+2])
@@ -262,8 +508,8 @@ def get_word_level_diff(original: str, modified: str) -> tuple[str, List[WordCha
             
             word_changes.append(WordChange(
                 change_type="replaced",
-                old_text=' '.join(old),
-                new_text=' '.join(new),
+                old_text=old,
+                new_text=new,
                 context=context
             ))
     
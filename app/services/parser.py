@@ -4,54 +4,57 @@ Converts Word documents (.docx) into structured content blocks.
 """
 
 import io
-from typing import List
-from docx import Document
+from typing import List, BinaryIO
 
 from app.models import ContentBlock
 
 
-def parse_document(file_bytes: bytes) -> List[ContentBlock]:
+def parse_document(source: bytes | BinaryIO) -> List[ContentBlock]:
     """
     Parse a Word document into a list of content blocks.
     
     Args:
-        file_bytes: Raw bytes of the .docx file
+        source: Raw bytes of the .docx file, or a seekable file object
         
     Returns:
         List of ContentBlock objects representing document structure
     """
-    doc = Document(io.BytesIO(file_bytes))
+    from docx import Document  # Deferred: python-docx is slow to import
+    
+    doc = Document(io.BytesIO(source) if isinstance(source, bytes) else source)
     blocks = []
     index = 0
     
+    # Index wrappers by their XML element once, so the body walk is linear
+    para_by_element = {para._element: para for para in doc.paragraphs}
+    table_by_element = {table._element: table for table in doc.tables}
+    
     # Iterate through document body elements in order
     for element in doc.element.body:
         tag = element.tag.split('}')[-1]  # Get tag name without namespace
         
         if tag == 'p':  # Paragraph
-            for para in doc.paragraphs:
-                if para._element is element:
-                    text = para.text.strip()
-                    if text:  # Skip empty paragraphs
-                        blocks.append(ContentBlock(
-                            index=index,
-                            block_type="paragraph",
-                            content=text
-                        ))
-                        index += 1
-                    break
-                    
-        elif tag == 'tbl':  # Table
-            for table in doc.tables:
-                if table._element is element:
-                    table_text = _table_to_text(table)
+            para = para_by_element.get(element)
+            if para is not None:
+                text = para.text.strip()
+                if text:  # Skip empty paragraphs
                     blocks.append(ContentBlock(
                         index=index,
-                        block_type="table",
-                        content=table_text
+                        block_type="paragraph",
+                        content=text
                     ))
                     index += 1
-                    break
+                    
+        elif tag == 'tbl':  # Table
+            table = table_by_element.get(element)
+            if table is not None:
+                table_text = _table_to_text(table)
+                blocks.append(ContentBlock(
+                    index=index,
+                    block_type="table",
+                    content=table_text
+                ))
+                index += 1
     
     return blocks
 
@@ -67,11 +70,15 @@ def _table_to_text(table) -> str:
         Val1 | Val2 | Val3
         [/TABLE]
     """
-    rows = []
-    for i, row in enumerate(table.rows):
-        cells = [cell.text.strip() for cell in row.cells]
-        rows.append(" | ".join(cells))
+    buf = io.StringIO()
+    buf.write("[TABLE]\n")
+    rows = table.rows
+    for i, row in enumerate(rows):
+        buf.write(" | ".join(cell.text.strip() for cell in row.cells))
+        buf.write("\n")
         if i == 0:  # Add separator after header
-            rows.append("---")
+            buf.write("---\n")
+    if not len(rows):  # Empty table keeps its blank body line
+        buf.write("\n")
     
-    return "[TABLE]\n" + "\n".join(rows) + "\n[/TABLE]"
+    return buf.getvalue() + "[/TABLE]"
@@ -3,8 +3,13 @@ Utilities package.
 """
 
 from app.utils.storage import document_storage, DocumentStorage
+from app.utils.rate_limiter import RateLimiter
+from app.utils.llm_cache import llm_cache, LLMCache
 
 __all__ = [
     "document_storage",
     "DocumentStorage",
+    "RateLimiter",
+    "llm_cache",
+    "LLMCache",
 ]
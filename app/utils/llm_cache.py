@@ -0,0 +1,189 @@
+"""
+LLM classification cache.
+In-memory LRU cache of per-change LLM results, optionally backed by SQLite
+so answers survive restarts (can be swapped for Redis later).
+"""
+
+import re
+import json
+import time
+import logging
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize(text: str | None) -> str:
+    """Lowercase and collapse whitespace so trivially different texts share a key."""
+    if not text:
+        return ""
+    return _WHITESPACE_RE.sub(' ', text).strip().lower()
+
+
+class LLMCache:
+    """
+    Bounded LRU cache mapping a change's content to its LLM classification.
+    
+    Calls are made at temperature=0, so identical questions get identical
+    answers and can be served from cache. Values must be JSON-serializable
+    when a SQLite path is configured.
+    
+    The cache is best-effort: SQLite errors (e.g. "database is locked" with
+    several workers sharing one file) are logged and treated as misses or
+    dropped writes, never raised. Methods block on SQLite, so async callers
+    should run them in a thread.
+    """
+    
+    def __init__(self, maxsize: int = 4096, path: str | None = None, ttl_seconds: int = 30 * 86400):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._storage: OrderedDict[str, tuple] = OrderedDict()
+        self._db = None
+        self._lock = threading.Lock()  # Guards the LRU, the counters and the connection
+        if path:
+            try:
+                self._db = sqlite3.connect(path, timeout=5, check_same_thread=False)
+                # WAL lets concurrent workers read while one writes
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute("PRAGMA synchronous=NORMAL")
+                with self._db:
+                    self._db.execute(
+                        "CREATE TABLE IF NOT EXISTS llm_cache "
+                        "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+                    )
+                    self._db.execute("DELETE FROM llm_cache WHERE expires < ?", (time.time(),))
+            except sqlite3.Error as e:
+                logger.warning("LLM cache database unavailable, using memory only: %s", e)
+                self._db = None
+    
+    @staticmethod
+    def make_key(
+        model: str,
+        document_type: str,
+        block_type: str,
+        original: str | None,
+        modified: str | None
+    ) -> str:
+        """Build the cache key: sha256 over the model, document/block type and normalized texts."""
+        raw = json.dumps(
+            [model, document_type, block_type, _normalize(original), _normalize(modified)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    def get(self, key: str) -> Optional[tuple]:
+        """Retrieve a cached classification, marking it recently used."""
+        return self.get_many([key]).get(key)
+    
+    def get_many(self, keys: Iterable[str]) -> dict[str, tuple]:
+        """Retrieve cached classifications for several keys, with one SQLite query for memory misses."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._storage.get(key)
+                if value is not None:
+                    self._storage.move_to_end(key)
+                    found[key] = value
+            
+            missing = [key for key in keys if key not in found]
+            if missing and self._db is not None:
+                for key, value in self._db_get_many(missing).items():
+                    self._remember(key, value)
+                    found[key] = value
+            
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+    
+    def set(self, key: str, value: tuple) -> None:
+        """Store a classification, evicting the least recently used entry if full."""
+        self.set_many([(key, value)])
+    
+    def set_many(self, items: Iterable[tuple[str, tuple]]) -> None:
+        """Store several classifications in one SQLite transaction."""
+        items = list(items)
+        if not items:
+            return
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value)
+            if self._db is None:
+                return
+            expires = time.time() + self.ttl_seconds
+            try:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO llm_cache (key, value, expires) VALUES (?, ?, ?)",
+                        [(key, json.dumps(value, ensure_ascii=False), expires) for key, value in items]
+                    )
+            except sqlite3.Error as e:
+                logger.warning("LLM cache write failed for %d entries: %s", len(items), e)
+    
+    def clear(self) -> None:
+        """Drop all cached classifications."""
+        with self._lock:
+            self._storage.clear()
+            if self._db is None:
+                return
+            try:
+                with self._db:
+                    self._db.execute("DELETE FROM llm_cache")
+            except sqlite3.Error as e:
+                logger.warning("LLM cache clear failed: %s", e)
+    
+    @property
+    def stats(self) -> dict:
+        """Hit/miss counters since startup."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "size": len(self._storage),
+        }
+    
+    def _remember(self, key: str, value: tuple) -> None:
+        """Insert into the in-memory LRU layer. Caller holds the lock."""
+        self._storage[key] = value
+        self._storage.move_to_end(key)
+        if len(self._storage) > self.maxsize:
+            self._storage.popitem(last=False)
+    
+    def _db_get_many(self, keys: list[str]) -> dict[str, tuple]:
+        """Look up unexpired entries in SQLite. Caller holds the lock."""
+        found = {}
+        now = time.time()
+        try:
+            # Stay under SQLite's bound-parameter limit on older builds
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, value FROM llm_cache WHERE key IN ({placeholders}) AND expires >= ?",
+                    (*batch, now)
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = tuple(json.loads(value))
+        except sqlite3.Error as e:
+            logger.warning("LLM cache read failed: %s", e)
+        return found
+
+
+# Singleton instance
+llm_cache = LLMCache(
+    maxsize=settings.LLM_CACHE_SIZE,
+    path=settings.LLM_CACHE_PATH or None,
+    ttl_seconds=settings.LLM_CACHE_TTL,
+)
@@ -0,0 +1,55 @@
+"""
+Rate limiting utility.
+Async token bucket for API request/token budgets (e.g. OpenAI RPM/TPM limits).
+"""
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter tracking requests and tokens per minute.
+    
+    Both budgets refill continuously; a caller waits until it can spend
+    one request plus its estimated tokens. Modeled on the capacity loop in
+    openai-cookbook's api_request_parallel_processor.py.
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.max_requests = requests_per_minute
+        self.max_tokens = tokens_per_minute
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self) -> None:
+        """Add capacity accrued since the last update."""
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+        self._available_requests = min(
+            self.max_requests,
+            self._available_requests + self.max_requests * elapsed / 60
+        )
+        self._available_tokens = min(
+            self.max_tokens,
+            self._available_tokens + self.max_tokens * elapsed / 60
+        )
+    
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until one request and `tokens` tokens are available, then spend them."""
+        tokens = min(tokens, self.max_tokens)
+        
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._available_requests >= 1 and self._available_tokens >= tokens:
+                    self._available_requests -= 1
+                    self._available_tokens -= tokens
+                    return
+                
+                wait_requests = (1 - self._available_requests) * 60 / self.max_requests
+                wait_tokens = (tokens - self._available_tokens) * 60 / self.max_tokens
+                await asyncio.sleep(max(wait_requests, wait_tokens, 0.01))
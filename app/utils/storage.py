@@ -1,54 +1,162 @@
 """
 Document storage utility.
-In-memory storage for annotated documents (can be swapped for S3/Redis later).
+In-memory (or temp-dir) storage for annotated documents (can be swapped for S3/Redis later).
 """
 
+import os
 import time
-from typing import Optional
+import heapq
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Iterator, Optional
+
+from app.config import settings
 
 
 class DocumentStorage:
     """
     In-memory storage for annotated documents.
     
+    When a directory is given, documents are written there instead and only
+    their path is kept in memory, so downloads can stream from disk.
+    
+    Bounded to maxsize documents, evicting the least recently used, and
+    documents expire ttl_seconds after being stored. Creation times are
+    indexed in a min-heap so cleanup only touches expired entries.
+    
+    All index access goes through an RLock, so request handlers, executor
+    threads and the background sweeper can share one instance.
+    
     For production with multiple instances, replace with:
     - Redis for temporary storage
     - S3 for persistent storage
     """
     
-    def __init__(self):
-        self._storage: dict = {}
+    def __init__(self, directory: str | None = None, maxsize: int = 256, ttl_seconds: int = 3600):
+        self._storage: OrderedDict[str, dict] = OrderedDict()
+        self._expiry_heap: list[tuple[float, str]] = []  # (created, doc_id); may hold stale pairs
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._remove_stale_files()
     
     def store(self, doc_id: str, doc_bytes: bytes, filename: str) -> None:
-        """Store a document with metadata."""
-        self._storage[doc_id] = {
-            'bytes': doc_bytes,
+        """Store a document with metadata, evicting the least recently used if full."""
+        entry = {
             'filename': filename,
+            'size': len(doc_bytes),
             'created': time.time()
         }
+        if self.directory:
+            path = os.path.join(self.directory, f"{doc_id}.docx")
+            with open(path, 'wb') as f:
+                f.write(doc_bytes)
+            entry['path'] = path
+        else:
+            entry['bytes'] = doc_bytes
+        
+        with self._lock:
+            self._storage[doc_id] = entry
+            self._storage.move_to_end(doc_id)
+            heapq.heappush(self._expiry_heap, (entry['created'], doc_id))
+            
+            while len(self._storage) > self.maxsize:
+                self._remove(next(iter(self._storage)))
     
     def get(self, doc_id: str) -> Optional[dict]:
-        """Retrieve a document by ID."""
-        return self._storage.get(doc_id)
+        """Retrieve a document by ID, marking it recently used."""
+        with self._lock:
+            data = self._storage.get(doc_id)
+            if data is None:
+                return None
+            if time.time() - data['created'] > self.ttl_seconds:
+                self._remove(doc_id)
+                return None
+            self._storage.move_to_end(doc_id)
+            return data
+    
+    def open_document(self, doc_id: str) -> Optional[tuple[dict, BinaryIO | memoryview]]:
+        """
+        Retrieve a document and a readable source for its content.
+        
+        A disk-backed file is opened under the lock, so a later eviction or
+        sweep that unlinks it cannot truncate a download already under way.
+        """
+        with self._lock:
+            data = self.get(doc_id)
+            if data is None:
+                return None
+            if 'path' in data:
+                try:
+                    return data, open(data['path'], 'rb')
+                except FileNotFoundError:
+                    self._storage.pop(doc_id, None)
+                    return None
+            return data, memoryview(data['bytes'])
+    
+    @staticmethod
+    def iter_chunks(source: BinaryIO | memoryview, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield a document's content from open_document() in chunks, closing a file when done."""
+        if isinstance(source, memoryview):
+            for start in range(0, len(source), chunk_size):
+                yield source[start:start + chunk_size]
+            return
+        
+        with source:
+            while chunk := source.read(chunk_size):
+                yield chunk
     
     def delete(self, doc_id: str) -> bool:
         """Delete a document by ID."""
-        if doc_id in self._storage:
-            del self._storage[doc_id]
-            return True
-        return False
-    
-    def cleanup(self, max_age_seconds: int = 3600) -> int:
-        """Remove documents older than max_age_seconds. Returns count removed."""
-        now = time.time()
-        to_remove = [
-            doc_id for doc_id, data in self._storage.items()
-            if now - data['created'] > max_age_seconds
-        ]
-        for doc_id in to_remove:
-            del self._storage[doc_id]
-        return len(to_remove)
+        with self._lock:
+            if doc_id in self._storage:
+                self._remove(doc_id)
+                return True
+            return False
+    
+    def cleanup(self, max_age_seconds: int | None = None) -> int:
+        """Remove documents older than max_age_seconds (default: the TTL). Returns count removed."""
+        if max_age_seconds is None:
+            max_age_seconds = self.ttl_seconds
+        cutoff = time.time() - max_age_seconds
+        
+        removed = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] < cutoff:
+                created, doc_id = heapq.heappop(heap)
+                data = self._storage.get(doc_id)
+                # Skip pairs left behind by deletes, evictions and overwrites
+                if data is not None and data['created'] == created:
+                    self._remove(doc_id)
+                    removed += 1
+        return removed
+    
+    def _remove_stale_files(self) -> None:
+        """Delete documents left in the directory by a previous process; they are never indexed."""
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.docx'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+    
+    def _remove(self, doc_id: str) -> None:
+        """Drop an entry and its backing file, if any. Caller holds the lock."""
+        data = self._storage.pop(doc_id)
+        if 'path' in data:
+            try:
+                os.remove(data['path'])
+            except FileNotFoundError:
+                pass
 
 
 # Singleton instance
-document_storage = DocumentStorage()
+document_storage = DocumentStorage(
+    directory=settings.STORAGE_DIR or None,
+    maxsize=settings.STORAGE_MAX_DOCS,
+    ttl_seconds=settings.STORAGE_TTL,
+)
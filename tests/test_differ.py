@@ -0,0 +1,171 @@
+"""
+Tests for the diff engine's opcode alignment and block matching.
+"""
+
+import random
+
+import pytest
+
+from app.config import settings
+from app.models import ContentBlock
+from app.services import differ
+
+
+@pytest.fixture(params=[False, True], ids=["difflib", "rapidfuzz"])
+def use_rapidfuzz(request, monkeypatch):
+    """Run a test with USE_RAPIDFUZZ off and on."""
+    if request.param:
+        pytest.importorskip("rapidfuzz")
+    monkeypatch.setattr(settings, "USE_RAPIDFUZZ", request.param)
+    return request.param
+
+
+def _random_pairs(count: int = 500):
+    """Random short word sequences, with plenty of shared words."""
+    rng = random.Random(0)
+    for _ in range(count):
+        a = rng.choices("abcde", k=rng.randint(0, 12))
+        b = rng.choices("abcde", k=rng.randint(0, 12))
+        yield a, b
+
+
+def test_opcodes_cover_both_sequences_and_rebuild_target(use_rapidfuzz):
+    for a, b in _random_pairs():
+        opcodes = differ._get_opcodes(a, b)
+        
+        i, j = 0, 0
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            assert (i1, j1) == (i, j)
+            if tag == 'equal':
+                assert a[i1:i2] == b[j1:j2]
+            elif tag == 'insert':
+                assert i1 == i2 and j1 < j2
+            elif tag == 'delete':
+                assert i1 < i2 and j1 == j2
+            else:
+                assert tag == 'replace' and i1 < i2 and j1 < j2
+            rebuilt.extend(b[j1:j2])
+            i, j = i2, j2
+        
+        assert (i, j) == (len(a), len(b))
+        assert rebuilt == b
+
+
+def test_opcodes_never_have_adjacent_non_equal_runs(use_rapidfuzz):
+    for a, b in _random_pairs():
+        tags = [tag for tag, *_ in differ._get_opcodes(a, b)]
+        for first, second in zip(tags, tags[1:]):
+            assert first == 'equal' or second == 'equal'
+
+
+def test_word_level_diff_reports_replacement(use_rapidfuzz):
+    diff_text, word_changes = differ.get_word_level_diff(
+        "Bên A thanh toán 10 ngày", "Bên Mua thanh toán 10 ngày"
+    )
+    
+    assert diff_text == "Bên [-A-] [+Mua+] thanh toán 10 ngày"
+    assert [(wc.change_type, wc.old_text, wc.new_text) for wc in word_changes] == [
+        ("replaced", "A", "Mua")
+    ]
+
+
+def test_lsh_prefilter_keeps_short_renamed_paragraphs_matched():
+    pytest.importorskip("datasketch")
+    rng = random.Random(5)
+    vocab = "hợp đồng thanh toán điều khoản giá trị ngày hiệu lực bên nghĩa vụ".split()
+    v1 = [
+        ContentBlock(i, "paragraph", "Bên A " + " ".join(rng.choices(vocab, k=rng.randint(4, 8))))
+        for i in range(40)
+    ]
+    v2 = [
+        ContentBlock(i, "paragraph", block.content.replace("Bên A", "Bên Mua"))
+        for i, block in enumerate(v1)
+    ]
+    assert differ._lsh_candidates(v1, v2) is not None
+    
+    results = differ._match_similar_blocks(v1, v2)
+    
+    assert len(results) == 40
+    assert all(r['type'] == 'modified' for r in results)
+    assert all(r['v1'].index == r['v2'].index for r in results)
+
+
+def test_block_matching_agrees_with_exhaustive_difflib_scoring():
+    from difflib import SequenceMatcher
+    
+    def reference(v1_blocks, v2_blocks, threshold=0.5):
+        used, matches = set(), []
+        for b1 in v1_blocks:
+            best_idx, best_sim = None, 0
+            for idx, b2 in enumerate(v2_blocks):
+                if idx in used:
+                    continue
+                sim = SequenceMatcher(None, b1.content, b2.content, autojunk=False).ratio()
+                if sim > best_sim:
+                    best_idx, best_sim = idx, sim
+            if best_idx is not None and best_sim >= threshold:
+                used.add(best_idx)
+                matches.append((b1.index, best_idx, best_sim))
+        return matches
+    
+    rng = random.Random(3)
+    for _ in range(300):
+        v1, v2 = (
+            [
+                ContentBlock(i, "paragraph", "".join(rng.choices("abcde ", k=rng.randint(1, 40))))
+                for i in range(rng.randint(1, 8))
+            ]
+            for _ in range(2)
+        )
+        
+        results = differ._match_similar_blocks(v1, v2)
+        
+        matches = [
+            (r['v1'].index, r['v2'].index, r['similarity'])
+            for r in results if r['type'] == 'modified'
+        ]
+        assert matches == reference(v1, v2)
+
+
+# Long paragraph built from very common Vietnamese words: with autojunk,
+# nearly every character and word counts as "popular" and is ignored
+_COMMON_WORDS = "của và các có được trong cho với là người những một không này đã để theo đến khi từ".split()
+
+
+def _long_paragraph_pair():
+    words = [
+        _COMMON_WORDS[(i * 7 + i // len(_COMMON_WORDS)) % len(_COMMON_WORDS)]
+        for i in range(210)
+    ]
+    edited = list(words)
+    edited[100] = "hợp đồng"
+    return words, edited
+
+
+def test_long_vietnamese_paragraph_with_one_edit_is_modified():
+    from difflib import SequenceMatcher
+    
+    words, edited = _long_paragraph_pair()
+    original, modified = " ".join(words), " ".join(edited)
+    # Regression guard: autojunk alone pushes this pair under the threshold
+    assert SequenceMatcher(None, original, modified).ratio() < 0.5
+    
+    results = differ._match_similar_blocks(
+        [ContentBlock(0, "paragraph", original)],
+        [ContentBlock(0, "paragraph", modified)],
+    )
+    
+    assert [r['type'] for r in results] == ['modified']
+    assert results[0]['similarity'] > 0.99
+    assert [(wc.change_type, wc.old_text, wc.new_text) for wc in results[0]['word_changes']] == [
+        ("replaced", words[100], "hợp đồng")
+    ]
+
+
+def test_long_word_lists_have_no_spurious_replace(use_rapidfuzz):
+    words, edited = _long_paragraph_pair()
+    
+    non_equal = [op for op in differ._get_opcodes(words, edited) if op[0] != 'equal']
+    
+    assert non_equal == [('replace', 100, 101, 100, 101)]